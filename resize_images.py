@@ -1,26 +1,106 @@
+import heapq
+import logging
 import os
-import time
+import platform
+import sys
 import threading
+import time
 import queue
+import shutil
+import tempfile
 from pathlib import Path
+import imagesize
+import PIL
 from PIL import Image
-import pillow_heif
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileClosedEvent, FileMovedEvent
+from watchdog.utils import UnsupportedLibcError
+
+try:
+    import cv2
+except ImportError:  # OpenCV is optional, used for the metadata-free JPEG/PNG fast path
+    cv2 = None
+
+try:
+    import pyvips
+except ImportError:  # libvips is optional, Pillow handles everything without it
+    pyvips = None
 
-# Register HEIF opener with PIL
-pillow_heif.register_heif_opener()
+try:
+    from watchdog.observers.inotify import InotifyObserver
+except (ImportError, UnsupportedLibcError):  # inotify is only available on Linux
+    InotifyObserver = None
 
 # Default configuration
 PICTURES_FOLDER = "/home/pi/Pictures"
 MAX_WIDTH = 1080
 MAX_HEIGHT = 768
+
+# Resampling filter used when downscaling, selectable via IMAGE_RESIZER_FILTER
+RESAMPLE_FILTERS = {
+    'lanczos': Image.LANCZOS,
+    'bicubic': Image.BICUBIC,
+    'bilinear': Image.BILINEAR,
+    'hamming': Image.HAMMING,
+    'box': Image.BOX,
+}
+RESAMPLE_FILTER_NAME = os.environ.get('IMAGE_RESIZER_FILTER', 'bicubic').lower()
+RESAMPLE_FILTER = RESAMPLE_FILTERS.get(RESAMPLE_FILTER_NAME, Image.BICUBIC)
+
+# Largest image, in decoded pixels, we are willing to load, selectable via IMAGE_RESIZER_MAX_PIXELS.
+# Pillow's own check runs before draft() can shrink a JPEG, so it is disabled and ours runs after.
+# Every worker may hold one such image, so this is well below Pillow's 89 MP warning threshold
+MAX_IMAGE_PIXELS = int(os.environ.get('IMAGE_RESIZER_MAX_PIXELS', 8192 * 8192))
+Image.MAX_IMAGE_PIXELS = None
+
 FILE_CHECK_RETRIES = 10
 FILE_CHECK_INTERVAL = 0.1  # 100ms between checks
 MAX_QUEUE_RETRIES = 5  # Maximum number of times to requeue a file
+MAX_QUEUE_SIZE = 1024  # Producers block when this many files are waiting
+REQUEUE_DELAY = 0.1  # Seconds before a failed file goes back into the queue
+DEBOUNCE_DELAY = 0.2  # Seconds without new events before a watched file is queued
+NUM_WORKERS = os.cpu_count() or 1  # Pillow releases the GIL while resizing, so use every core
+
+logger = logging.getLogger(__name__)
+
+# Encoder settings per output format; HEIC/HEIF files are converted to JPEG
+SAVE_DEFAULTS = {
+    'JPEG': {'format': 'JPEG', 'quality': 95, 'optimize': True, 'progressive': True},
+    'PNG': {'format': 'PNG', 'optimize': False},
+    'TIFF': {'format': 'TIFF', 'compression': None},
+    'BMP': {'format': 'BMP'},
+    'GIF': {'format': 'GIF'},
+}
+EXT_TO_FORMAT = {
+    'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'tiff': 'TIFF', 'bmp': 'BMP', 'gif': 'GIF',
+    'heic': 'JPEG', 'heif': 'JPEG',
+}
+CONVERT_ONLY_QUALITY = 90  # JPEG quality for HEIC files that are converted without resizing
+
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif', '.heic', '.heif'})
 
 # Thread-safe queue to store new file paths
-file_queue = queue.Queue()
+file_queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
+
+# Files waiting to be queued after a delay: path -> (deadline, queue item), plus a heap of
+# (deadline, path) so the scheduler thread can find the next one. Rescheduling a path
+# replaces its entry, and stale heap entries are skipped
+delayed_files = {}
+delayed_deadlines = []
+delayed_files_cond = threading.Condition()
+
+# pillow_heif loads libheif, so it is only imported once a HEIC file shows up
+heif_registered = False
+heif_lock = threading.Lock()
+
+def ensure_heif_opener():
+    """Import pillow_heif and register its HEIF opener with PIL on first use"""
+    global heif_registered
+    with heif_lock:
+        if not heif_registered:
+            import pillow_heif
+            pillow_heif.register_heif_opener()
+            heif_registered = True
 
 def wait_for_file_stability(file_path, max_retries=FILE_CHECK_RETRIES, check_interval=FILE_CHECK_INTERVAL):
     """Wait for file to be completely written by checking if its size remains stable"""
@@ -37,120 +117,294 @@ def wait_for_file_stability(file_path, max_retries=FILE_CHECK_RETRIES, check_int
             continue
     return False
 
-def resize_image(image_path, attempt=1):
+def schedule_file(image_path, attempt, delay, check_stability=False):
+    """Queue a file after delay seconds; scheduling the same path again restarts its delay"""
+    deadline = time.monotonic() + delay
+    with delayed_files_cond:
+        delayed_files[image_path] = (deadline, (image_path, attempt, check_stability))
+        heapq.heappush(delayed_deadlines, (deadline, image_path))
+        delayed_files_cond.notify()
+
+def process_delayed_files():
+    """Moves files whose delay has passed into the queue, from a single thread"""
+    while True:
+        with delayed_files_cond:
+            while True:
+                if not delayed_deadlines:
+                    delayed_files_cond.wait()
+                    continue
+                deadline, image_path = delayed_deadlines[0]
+                now = time.monotonic()
+                if deadline > now:
+                    delayed_files_cond.wait(deadline - now)
+                    continue
+                heapq.heappop(delayed_deadlines)
+                entry = delayed_files.get(image_path)
+                if entry is not None and entry[0] == deadline:
+                    del delayed_files[image_path]
+                    item = entry[1]
+                    break
+        # Blocking here while the queue is full is the intended backpressure; workers never wait on it
+        file_queue.put(item)
+
+def requeue(image_path, attempt, check_stability=False):
+    """Put a file back into the queue after REQUEUE_DELAY"""
+    schedule_file(image_path, attempt, REQUEUE_DELAY, check_stability)
+
+def check_pillow_build():
+    """Report whether the SIMD-accelerated Pillow fork is in use on this machine"""
+    machine = platform.machine().lower()
+    if machine not in ('x86_64', 'amd64', 'i386', 'i686'):
+        logger.warning(f"Running on {machine}: Pillow-SIMD has no NEON support, using stock Pillow")
+    elif '.post' in PIL.__version__:  # Pillow-SIMD versions carry a .postN suffix
+        logger.info(f"Using Pillow-SIMD {PIL.__version__}")
+    else:
+        logger.info(f"Using stock Pillow {PIL.__version__}; install Pillow-SIMD for faster resizing")
+
+def check_resample_filter():
+    """Warn if IMAGE_RESIZER_FILTER names a filter we do not know"""
+    if RESAMPLE_FILTER_NAME not in RESAMPLE_FILTERS:
+        logger.warning(f"Unknown IMAGE_RESIZER_FILTER '{RESAMPLE_FILTER_NAME}', using bicubic. "
+                       f"Accepted values: {', '.join(RESAMPLE_FILTERS)}")
+
+def write_atomically(path, write, source_path=None):
+    """Call write() on a temporary file and move it over path, so watchers and readers never see a partial file.
+    The result gets the mode and owner of source_path, which defaults to path itself"""
+    source_stat = os.stat(source_path or path)
+    # A unique name per call, so two workers handling the same path never share a temp file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        shutil.copymode(source_path or path, tmp_path)
+        if hasattr(os, 'chown'):
+            try:
+                os.chown(tmp_path, source_stat.st_uid, source_stat.st_gid)
+            except PermissionError:  # Only root may give files away to other users
+                pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def convert_heic_with_vips(image_path, new_path):
+    """Resize and convert a HEIC file to JPEG in one streaming libvips pass, returns False if it could not"""
+    if pyvips is None:
+        return False
+    jpeg = SAVE_DEFAULTS['JPEG']
+    try:
+        source = pyvips.Image.new_from_file(image_path)  # Only reads the header
+        if source.width <= MAX_WIDTH and source.height <= MAX_HEIGHT:
+            quality = CONVERT_ONLY_QUALITY
+        else:
+            quality = jpeg['quality']
+        img = pyvips.Image.thumbnail(image_path, MAX_WIDTH, height=MAX_HEIGHT, size='down')
+        write_atomically(new_path, lambda tmp_path: img.jpegsave(
+            tmp_path, Q=quality, optimize_coding=jpeg['optimize'], interlace=jpeg['progressive'], strip=False), image_path)
+    except pyvips.Error as e:
+        logger.warning(f"libvips could not convert {image_path}, falling back to Pillow: {str(e)}")
+        return False
+    return True
+
+def flatten_alpha(img):
+    """Composite an RGBA image onto white, for formats without alpha"""
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel('A'))
+    return background
+
+def compute_target_size(width, height, max_width, max_height):
+    """Fit width x height into max_width x max_height keeping the aspect ratio, like Image.thumbnail"""
+    scale = min(max_width / width, max_height / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def has_complete_trailer(image_path, file_ext):
+    """Check that a JPEG ends with its EOI marker or a PNG with its IEND chunk"""
+    trailer = b'IEND\xaeB`\x82' if file_ext == 'png' else b'\xff\xd9'
+    with open(image_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - len(trailer)))
+        return f.read() == trailer
+
+def resize_with_opencv(image_path, file_ext, size):
+    """Resize a JPEG or PNG in place with OpenCV's SIMD area filter, returns False if it could not"""
+    if cv2 is None:
+        return False
+
+    width, height = size
+    new_width, new_height = compute_target_size(width, height, MAX_WIDTH, MAX_HEIGHT)
+    if (new_width, new_height) == (width, height):
+        logger.info(f"No resize needed for {image_path} ({width}x{height})")
+        return True
+
+    # OpenCV fills a truncated file with grey instead of failing, so leave
+    # anything incomplete to Pillow, which raises and requeues it
+    if not has_complete_trailer(image_path, file_ext):
+        return False
+    arr = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+    if arr is None:
+        return False
+
+    out = cv2.resize(arr, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
+    params = []
+    if file_ext in ('jpg', 'jpeg'):
+        jpeg = SAVE_DEFAULTS['JPEG']
+        params = [cv2.IMWRITE_JPEG_QUALITY, jpeg['quality'],
+                  cv2.IMWRITE_JPEG_OPTIMIZE, int(jpeg['optimize']),
+                  cv2.IMWRITE_JPEG_PROGRESSIVE, int(jpeg['progressive'])]
+    encoded, buf = cv2.imencode('.' + file_ext, out, params)
+    if not encoded:
+        raise OSError(f"OpenCV could not encode {image_path}")
+    write_atomically(image_path, buf.tofile)
+    logger.info(f"Resized image with OpenCV from {width}x{height} to {new_width}x{new_height}")
+    return True
+
+def build_save_kwargs(file_ext, exif, icc_profile, **overrides):
+    """Return the img.save() arguments for file_ext, carrying over EXIF and ICC data if present"""
+    kwargs = {**SAVE_DEFAULTS.get(EXT_TO_FORMAT.get(file_ext), {}), **overrides}
+    if exif is not None:  # Only include exif if it exists
+        kwargs['exif'] = exif
+    if icc_profile is not None:  # Only include ICC if it exists
+        kwargs['icc_profile'] = icc_profile
+    return kwargs
+
+def resize_image(image_path, attempt=1, check_stability=False):
     """ Resize image while maintaining aspect ratio and quality """
     try:
-        print(f"Checking if file is ready: {image_path} (attempt {attempt})")
-        if not wait_for_file_stability(image_path):
-            if attempt < MAX_QUEUE_RETRIES:
-                print(f"File not ready yet, requeueing: {image_path}")
-                file_queue.put((image_path, attempt + 1))
-            else:
-                print(f"Max retries reached, skipping file: {image_path}")
+        # Without inotify close events we cannot tell when a new file is complete
+        if check_stability:
+            logger.info(f"Checking if file is ready: {image_path} (attempt {attempt})")
+            if not wait_for_file_stability(image_path):
+                if attempt < MAX_QUEUE_RETRIES:
+                    logger.warning(f"File not ready yet, requeueing: {image_path}")
+                    requeue(image_path, attempt + 1, check_stability)
+                else:
+                    logger.warning(f"Max retries reached, skipping file: {image_path}")
+                return
+
+        logger.info(f"Processing image: {image_path} (attempt {attempt})")
+        base_path, file_ext = os.path.splitext(image_path)
+        file_ext = file_ext[1:].lower()
+
+        # Read only the header to skip images that are already small enough
+        if file_ext not in ('heic', 'heif'):
+            width, height = imagesize.get(image_path)
+            if 0 < width <= MAX_WIDTH and 0 < height <= MAX_HEIGHT:
+                logger.info(f"No resize needed for {image_path} ({width}x{height})")
+                return
+        elif convert_heic_with_vips(image_path, base_path + '.jpg'):
+            try:
+                os.remove(image_path)  # Remove original HEIC file
+                logger.info(f"Converted HEIC to JPEG with libvips: {base_path}.jpg")
+            except Exception as e:
+                logger.error(f"Error removing original HEIC file: {str(e)}")
             return
-        
-        print(f"Processing image: {image_path}")
+        else:
+            ensure_heif_opener()
+
         with Image.open(image_path) as img:
             # Preserve EXIF and other metadata if available
             exif = img.info.get('exif', None)  # Explicitly handle None case
             icc_profile = img.info.get('icc_profile', None)  # Same for ICC profile
-            
-            # Convert to RGB if needed, preserving alpha channel if present
-            if img.mode == 'RGBA':
-                img = img
-            elif img.mode != 'RGB':
+
+            # Without metadata to keep, JPEG/PNG can be resized in a single OpenCV pass
+            # OpenCV always decodes at full size, so it is only used for images within the pixel limit
+            if (exif is None and icc_profile is None and file_ext in ('jpg', 'jpeg', 'png')
+                    and img.width * img.height <= MAX_IMAGE_PIXELS):
+                if resize_with_opencv(image_path, file_ext, img.size):
+                    return
+
+            # Let libjpeg scale down during decode (1/2, 1/4, 1/8) for large JPEGs, keeping
+            # at least twice the target size so the resize filter still has detail to work with
+            if img.format == 'JPEG':
+                img.draft('RGB', (MAX_WIDTH * 2, MAX_HEIGHT * 2))
+
+            # Checked after drafting, so large JPEGs are judged by the size they actually decode at
+            if img.width * img.height > MAX_IMAGE_PIXELS:
+                logger.error(f"Skipping oversized image {image_path} ({img.width}x{img.height}), "
+                             f"above IMAGE_RESIZER_MAX_PIXELS={MAX_IMAGE_PIXELS}")  # Retrying would not help
+                return
+
+            # Convert to RGB if needed, preserving alpha channel unless saving as JPEG
+            if img.mode not in ('RGB', 'RGBA'):
                 img = img.convert('RGB')
+            elif img.mode == 'RGBA' and EXT_TO_FORMAT.get(file_ext) == 'JPEG':
+                img = flatten_alpha(img)
 
             # Check if resizing is needed
             width, height = img.size
             if width <= MAX_WIDTH and height <= MAX_HEIGHT:
                 # If it's a HEIC file, we still need to convert it to JPEG
-                if image_path.lower().endswith(('.heic', '.heif')):
-                    new_path = os.path.splitext(image_path)[0] + '.jpg'
-                    save_kwargs = {'quality': 100, 'optimize': False}
-                    if exif is not None:  # Only include exif if it exists
-                        save_kwargs['exif'] = exif
-                    if icc_profile is not None:  # Only include ICC if it exists
-                        save_kwargs['icc_profile'] = icc_profile
-                    img.save(new_path, 'JPEG', **save_kwargs)
+                if file_ext in ('heic', 'heif'):
+                    new_path = base_path + '.jpg'
+                    # Nothing to resize, so use a more compact quality for the plain format conversion
+                    save_kwargs = build_save_kwargs(file_ext, exif, icc_profile, quality=CONVERT_ONLY_QUALITY)
+                    write_atomically(new_path, lambda tmp_path: img.save(tmp_path, **save_kwargs), image_path)
                     try:
                         os.remove(image_path)  # Remove original HEIC file
-                        print(f"Converted HEIC to JPEG: {new_path}")
+                        logger.info(f"Converted HEIC to JPEG: {new_path}")
                     except Exception as e:
-                        print(f"Error removing original HEIC file: {str(e)}")
+                        logger.error(f"Error removing original HEIC file: {str(e)}")
                 else:
-                    print(f"No resize needed for {image_path} ({width}x{height})")
+                    logger.info(f"No resize needed for {image_path} ({width}x{height})")
                 return
 
-            print(f"Current image size: {width}x{height}")
-
-            # Calculate memory requirements and use progressive loading if needed
-            memory_estimate = (width * height * 3) / (1024 * 1024)  # In MB
-            if memory_estimate > 500:  # If image might use more than 500MB
-                print(f"Large image detected ({memory_estimate:.2f}MB), using progressive loading")
-                img.draft('RGB', (width//2, height//2))
+            logger.info(f"Current image size: {width}x{height}")
 
             # Resize while maintaining aspect ratio
-            img.thumbnail((MAX_WIDTH, MAX_HEIGHT), Image.LANCZOS)
+            img.thumbnail((MAX_WIDTH, MAX_HEIGHT), RESAMPLE_FILTER)
             new_width, new_height = img.size
-            print(f"Resizing image from {width}x{height} to {new_width}x{new_height}")
-
-            # Handle HEIC/HEIF files specially
-            file_ext = image_path.lower().split('.')[-1]
-            if file_ext in ['heic', 'heif']:
-                new_path = os.path.splitext(image_path)[0] + '.jpg'
-                save_kwargs = {'quality': 100, 'optimize': False}
-                if exif is not None:  # Only include exif if it exists
-                    save_kwargs['exif'] = exif
-                if icc_profile is not None:  # Only include ICC if it exists
-                    save_kwargs['icc_profile'] = icc_profile
-                
-                img.save(new_path, 'JPEG', **save_kwargs)
+            logger.info(f"Resizing image from {width}x{height} to {new_width}x{new_height}")
+
+            # HEIC/HEIF files are written out as JPEG next to the original
+            is_heic = file_ext in ('heic', 'heif')
+            new_path = base_path + '.jpg' if is_heic else image_path
+            save_kwargs = build_save_kwargs(file_ext, exif, icc_profile)
+            write_atomically(new_path, lambda tmp_path: img.save(tmp_path, **save_kwargs), image_path)
+            if is_heic:
                 try:
                     os.remove(image_path)  # Remove original HEIC file
-                    print(f"Converted and resized HEIC to JPEG: {new_path}")
+                    logger.info(f"Converted and resized HEIC to JPEG: {new_path}")
                 except Exception as e:
-                    print(f"Error removing original HEIC file: {str(e)}")
+                    logger.error(f"Error removing original HEIC file: {str(e)}")
             else:
-                # For other formats, use original settings
-                save_kwargs = {
-                    'jpg': {'format': 'JPEG', 'quality': 100, 'optimize': False},
-                    'jpeg': {'format': 'JPEG', 'quality': 100, 'optimize': False},
-                    'png': {'format': 'PNG', 'optimize': False},
-                    'tiff': {'format': 'TIFF', 'compression': None}
-                }
-
-                kwargs = save_kwargs.get(file_ext, {})
-                if exif is not None:  # Only include exif if it exists
-                    kwargs['exif'] = exif
-                if icc_profile is not None:  # Only include ICC if it exists
-                    kwargs['icc_profile'] = icc_profile
-                
-                img.save(image_path, **kwargs)
-                print(f"Successfully saved resized image: {image_path}")
+                logger.info(f"Successfully saved resized image: {image_path}")
 
     except Exception as e:
-        print(f"Error processing {image_path}: {str(e)}")
+        logger.error(f"Error processing {image_path}: {str(e)}")
         if attempt < MAX_QUEUE_RETRIES:
-            print(f"Requeueing due to error: {image_path}")
-            file_queue.put((image_path, attempt + 1))
+            logger.warning(f"Requeueing due to error: {image_path}")
+            requeue(image_path, attempt + 1, check_stability)
 
 def is_image_file(filename):
     """Check if a file is an image based on its extension"""
-    return filename.lower().endswith(('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif', '.heic', '.heif'))
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+def iter_image_files(folder):
+    """Yield the paths of all images below folder, using scandir to avoid per-entry stat calls"""
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and is_image_file(entry.name):
+                        yield entry.path
+        except OSError as e:
+            logger.error(f"Error scanning {directory}: {str(e)}")
 
 def scan_existing_files():
     """Scan for existing images in the PICTURES_FOLDER and process them"""
-    print(f"\nScanning existing files in {PICTURES_FOLDER}")
+    logger.info(f"Scanning existing files in {PICTURES_FOLDER}")
     count = 0
-    for root, _, files in os.walk(PICTURES_FOLDER):
-        for filename in files:
-            if is_image_file(filename):
-                file_path = os.path.join(root, filename)
-                print(f"Found existing image: {file_path}")
-                file_queue.put((file_path, 1))  # Start with attempt 1
-                count += 1
-    print(f"Initial scan completed. Found {count} images to process.\n")
+    for file_path in iter_image_files(PICTURES_FOLDER):
+        logger.info(f"Found existing image: {file_path}")
+        file_queue.put((file_path, 1, False))  # Start with attempt 1, files on disk are complete
+        count += 1
+    logger.info(f"Initial scan completed. Found {count} images to process.")
 
 def process_new_files():
     """ Processes new files from the queue """
@@ -158,44 +412,72 @@ def process_new_files():
         try:
             item = file_queue.get()  # Get file from queue
             if isinstance(item, tuple):
-                image_path, attempt = item
+                image_path, attempt, check_stability = item
             else:
-                image_path, attempt = item, 1  # Handle old-style queue items
-            resize_image(image_path, attempt)
+                image_path, attempt, check_stability = item, 1, False  # Handle old-style queue items
+            resize_image(image_path, attempt, check_stability)
             file_queue.task_done()
         except Exception as e:
-            print(f"Error in process_new_files: {str(e)}")
+            logger.error(f"Error in process_new_files: {str(e)}")
 
 class ImageWatcher(FileSystemEventHandler):
     """ Watches for new image files and adds them to the queue """
     def on_created(self, event):
-        if not event.is_directory and is_image_file(event.src_path):
-            print(f"\nNew image detected: {event.src_path}")
-            file_queue.put((event.src_path, 1))  # Start with attempt 1
+        # A file may still be written to, unless it was moved in from outside the folder.
+        # With inotify, the close event that follows a write replaces this entry
+        if not event.is_directory:
+            self.enqueue(event.src_path, check_stability=True)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.enqueue(event.src_path)
+
+    def on_moved(self, event):
+        # Writers like rsync fill a temporary file and rename it into place
+        if not event.is_directory:
+            self.enqueue(event.dest_path)
+
+    def enqueue(self, path, check_stability=False):
+        if is_image_file(path):
+            logger.info(f"New image detected: {path}")
+            # Each new event for the path restarts the delay, so bursts queue the file only once
+            schedule_file(path, 1, DEBOUNCE_DELAY, check_stability)  # Start with attempt 1
 
 def start_watching():
     """ Watches the PICTURES_FOLDER for new files """
-    # First scan existing files
-    scan_existing_files()
-    
-    # Then start watching for new files
-    observer = Observer()
+    # Start watching before the scan: with the bounded queue the scan can take as long as
+    # processing the backlog, and images added meanwhile must not be missed.
+    # On Linux insist on inotify, since the polling fallback would stat the whole tree every second
+    if sys.platform.startswith('linux'):
+        if InotifyObserver is None:
+            raise RuntimeError("inotify is not available, refusing to fall back to a polling observer")
+        observer = InotifyObserver()
+    else:
+        observer = Observer()
     event_handler = ImageWatcher()
-    observer.schedule(event_handler, PICTURES_FOLDER, recursive=True)
+    observer.schedule(event_handler, PICTURES_FOLDER, recursive=True,
+                      event_filter=[FileCreatedEvent, FileClosedEvent, FileMovedEvent])
     observer.start()
-    print(f"Watching for new images in {PICTURES_FOLDER}")
+    logger.info(f"Watching for new images in {PICTURES_FOLDER}")
 
     try:
-        while True:
-            time.sleep(1)
+        # Then scan existing files
+        scan_existing_files()
+        observer.join()  # Block until the observer stops, without waking up periodically
     except KeyboardInterrupt:
-        print("\nStopping image watcher...")
+        logger.info("Stopping image watcher...")
         observer.stop()
-    observer.join()
+        observer.join()
 
 if __name__ == "__main__":
-    # Start the worker thread that processes images in the queue
-    worker_thread = threading.Thread(target=process_new_files, daemon=True)
-    worker_thread.start()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(threadName)s] %(message)s')
+    check_pillow_build()
+    check_resample_filter()
+
+    # Start the thread that queues delayed files, and the worker threads that process images in the queue
+    threading.Thread(target=process_delayed_files, name="scheduler", daemon=True).start()
+    for i in range(NUM_WORKERS):
+        worker_thread = threading.Thread(target=process_new_files, name=f"worker-{i + 1}", daemon=True)
+        worker_thread.start()
 
     start_watching()